@@ -6,6 +6,7 @@ Helps identify why motors have >10000 steps drift
 Run this to diagnose the sync issue before using joystick interface
 """
 
+import re
 import serial
 import time
 import sys
@@ -13,10 +14,24 @@ import sys
 TEENSY_PORT = '/dev/ttyACM0'
 BAUD_RATE = 115200
 
+# Pre-encoded frames for the fixed command vocabulary - avoids a fresh
+# format + encode + bytes allocation on every send
+_CMD_BYTES = {cmd: f"{cmd}\n".encode() for cmd in
+              ("FORWARD", "BACKWARD", "RUN", "STOP", "ESTOP", "STATUS",
+               "RESET", "ENABLE", "DISABLE", "SYNC")}
+
+def emit(*lines):
+    """Write a block of output lines in one syscall instead of one per print"""
+    sys.stdout.write("\n".join(lines) + "\n")
+
 def connect_teensy():
     """Connect to Teensy"""
     try:
-        ser = serial.Serial(TEENSY_PORT, BAUD_RATE, timeout=2)
+        ser = serial.Serial(TEENSY_PORT, BAUD_RATE, timeout=0.2)
+        try:
+            ser.set_low_latency_mode(True)  # Skip the USB-CDC ~16ms buffering tick
+        except (AttributeError, ValueError, OSError):
+            pass  # Not supported on this platform/pyserial version
         time.sleep(2)  # Wait for connection
         print("✓ Connected to Teensy")
         return ser
@@ -26,43 +41,38 @@ def connect_teensy():
 
 def send_command(ser, command):
     """Send command and get response"""
-    ser.write(f"{command}\n".encode())
-    time.sleep(0.1)
+    ser.write(_CMD_BYTES.get(command) or f"{command}\n".encode())
+    ser.flush()
+    # Block in readline() (serial timeout does the waiting) instead of
+    # sleeping a fixed 100ms before draining the input buffer
     response = []
-    while ser.in_waiting:
-        line = ser.readline().decode().strip()
+    deadline = time.monotonic() + 0.3
+    while time.monotonic() < deadline:
+        line = ser.readline()
+        if not line:
+            break  # Timeout - Teensy is done responding
+        line = line.decode().strip()
         if line:
             response.append(line)
     return response
 
+# Matches each motor section of the STATUS output through to its Position line
+_POS_RE = re.compile(r"Motor\s*(\d).*?Position:\s*(-?\d+)", re.S)
+
 def get_motor_positions(ser):
     """Get current motor positions"""
     response = send_command(ser, "STATUS")
-    
-    motor1_pos = None
-    motor2_pos = None
-    
-    for line in response:
-        if "Motor 1" in line:
-            reading_m1 = True
-        if "Motor 2" in line:
-            reading_m1 = False
-        if "Position:" in line:
-            pos = int(line.split(":")[1].strip())
-            if reading_m1:
-                motor1_pos = pos
-            else:
-                motor2_pos = pos
-    
-    return motor1_pos, motor2_pos
+
+    positions = {int(m): int(p) for m, p in _POS_RE.findall("\n".join(response))}
+    return positions.get(1), positions.get(2)
 
 def run_diagnostic():
     """Run comprehensive sync diagnostic"""
-    print("="*60)
-    print("MOTOR SYNCHRONIZATION DIAGNOSTIC")
-    print("="*60)
-    print()
-    
+    emit("="*60,
+         "MOTOR SYNCHRONIZATION DIAGNOSTIC",
+         "="*60,
+         "")
+
     # Connect
     ser = connect_teensy()
     if not ser:
@@ -70,14 +80,14 @@ def run_diagnostic():
     
     try:
         # Test 1: Initial positions
-        print("TEST 1: Initial Position Check")
-        print("-" * 40)
+        emit("TEST 1: Initial Position Check",
+             "-" * 40)
         send_command(ser, "SYNC")
         time.sleep(0.5)
         m1, m2 = get_motor_positions(ser)
-        print(f"Motor 1 Position: {m1}")
-        print(f"Motor 2 Position: {m2}")
-        print(f"Drift: {abs(m1 - m2)} steps")
+        emit(f"Motor 1 Position: {m1}",
+             f"Motor 2 Position: {m2}",
+             f"Drift: {abs(m1 - m2)} steps")
         
         if abs(m1 - m2) > 10:
             print("⚠️  WARNING: Motors not synced after SYNC command!")
@@ -86,8 +96,8 @@ def run_diagnostic():
         print()
         
         # Test 2: Short run test
-        print("TEST 2: Short Run Test (5 seconds at 2000 steps/sec)")
-        print("-" * 40)
+        emit("TEST 2: Short Run Test (5 seconds at 2000 steps/sec)",
+             "-" * 40)
         send_command(ser, "SYNC")
         time.sleep(0.5)
         
@@ -98,8 +108,13 @@ def run_diagnostic():
         
         # Track positions over time
         print("Monitoring positions every second:")
+        next_sample = time.monotonic()
         for i in range(5):
-            time.sleep(1)
+            # Sample on a fixed 1s grid: sleep only for what is left of
+            # the second after the previous STATUS round-trip, so the
+            # period is 1s rather than 1s + RTT
+            next_sample += 1.0
+            time.sleep(max(0, next_sample - time.monotonic()))
             m1, m2 = get_motor_positions(ser)
             drift = abs(m1 - m2)
             print(f"  Second {i+1}: M1={m1:6d} | M2={m2:6d} | Drift={drift:5d} steps")
@@ -123,8 +138,8 @@ def run_diagnostic():
         print()
         
         # Test 3: Direction change test
-        print("TEST 3: Direction Change Test")
-        print("-" * 40)
+        emit("TEST 3: Direction Change Test",
+             "-" * 40)
         send_command(ser, "SYNC")
         time.sleep(0.5)
         
@@ -152,49 +167,57 @@ def run_diagnostic():
         print()
         
         # Diagnosis
-        print("="*60)
-        print("DIAGNOSIS")
-        print("="*60)
-        
+        emit("="*60,
+             "DIAGNOSIS",
+             "="*60)
+
         if final_drift > 1000:
-            print("\n🔴 CRITICAL ISSUE: One motor is losing steps")
-            print("\nPossible Causes:")
-            print("  1. DIP switches don't match between drivers")
-            print("     - Check both are: SW5:ON, SW6:ON, SW7:ON, SW8:OFF")
-            print("  2. One motor has mechanical resistance")
-            print("     - Check for wheel friction, belt tension")
-            print("  3. Driver current setting too low")
-            print("     - Verify both drivers set to ~5A (80-90% of 6A)")
-            print("  4. Power supply insufficient")
-            print("     - Check voltage under load (should be 48V)")
-            print("  5. Loose wiring connections")
-            print("     - Check PUL+ and DIR+ connections")
-            print("\nRecommended Actions:")
-            print("  1. Power off and verify DIP switches")
-            print("  2. Check driver current potentiometer settings")
-            print("  3. Test each motor individually")
-            print("  4. Check mechanical setup")
-        
+            emit("",
+                 "🔴 CRITICAL ISSUE: One motor is losing steps",
+                 "",
+                 "Possible Causes:",
+                 "  1. DIP switches don't match between drivers",
+                 "     - Check both are: SW5:ON, SW6:ON, SW7:ON, SW8:OFF",
+                 "  2. One motor has mechanical resistance",
+                 "     - Check for wheel friction, belt tension",
+                 "  3. Driver current setting too low",
+                 "     - Verify both drivers set to ~5A (80-90% of 6A)",
+                 "  4. Power supply insufficient",
+                 "     - Check voltage under load (should be 48V)",
+                 "  5. Loose wiring connections",
+                 "     - Check PUL+ and DIR+ connections",
+                 "",
+                 "Recommended Actions:",
+                 "  1. Power off and verify DIP switches",
+                 "  2. Check driver current potentiometer settings",
+                 "  3. Test each motor individually",
+                 "  4. Check mechanical setup")
+
         elif final_drift > 100:
-            print("\n⚠️  MODERATE ISSUE: Motors drifting more than expected")
-            print("\nPossible Causes:")
-            print("  1. Slight difference in mechanical load")
-            print("  2. Timer precision at high speeds")
-            print("  3. Minor electrical noise")
-            print("\nRecommended Actions:")
-            print("  1. Monitor drift during actual use")
-            print("  2. Use SYNC command periodically")
-            print("  3. Reduce max speed if drift worsens")
-        
+            emit("",
+                 "⚠️  MODERATE ISSUE: Motors drifting more than expected",
+                 "",
+                 "Possible Causes:",
+                 "  1. Slight difference in mechanical load",
+                 "  2. Timer precision at high speeds",
+                 "  3. Minor electrical noise",
+                 "",
+                 "Recommended Actions:",
+                 "  1. Monitor drift during actual use",
+                 "  2. Use SYNC command periodically",
+                 "  3. Reduce max speed if drift worsens")
+
         else:
-            print("\n✓ GOOD: Sync performance within acceptable range")
-            print("\nRecommendations:")
-            print("  - Continue monitoring during operation")
-            print("  - Use SYNC command if drift exceeds 100 steps")
-            print("  - System ready for joystick control")
-        
-        print()
-        print("="*60)
+            emit("",
+                 "✓ GOOD: Sync performance within acceptable range",
+                 "",
+                 "Recommendations:",
+                 "  - Continue monitoring during operation",
+                 "  - Use SYNC command if drift exceeds 100 steps",
+                 "  - System ready for joystick control")
+
+        emit("",
+             "="*60)
     
     finally:
         ser.close()
@@ -8,12 +8,48 @@ Author: Daniel Khito
 Date: 2025
 """
 
+import functools
+import os
 import serial
+import selectors
 import time
 import threading
+import queue
+import termios
+import tty
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from typing import Optional
 import sys
 
+# Pre-encoded frames for the fixed command vocabulary - the joystick hot
+# path sends these constantly, so skip the format + encode per call
+_STATIC_CMDS = {name: (name + "\n").encode() for name in (
+    "STOP", "RUN", "ESTOP", "FORWARD", "BACKWARD", "STATUS", "RESET", "SYNC",
+    "M1:FORWARD", "M1:BACKWARD", "M2:FORWARD", "M2:BACKWARD",
+    "M1:RUN", "M2:RUN", "M1:STOP", "M2:STOP")}
+
+
+@functools.lru_cache(maxsize=4096)
+def _encode_speed(prefix: str, speed: int) -> bytes:
+    """Encode a speed command; joystick speeds repeat, so cache the bytes"""
+    return f"{prefix}:{speed}\n".encode()
+
+
+# Idempotent setpoint commands - re-sending one of these with the same
+# value does nothing, so exact repeats can be safely collapsed
+_IDEMPOTENT_PREFIXES = ("SPEED:", "M1:SPEED:", "M2:SPEED:",
+                        "FORWARD", "BACKWARD", "M1:FORWARD", "M1:BACKWARD",
+                        "M2:FORWARD", "M2:BACKWARD", "RUN", "M1:RUN", "M2:RUN",
+                        "SPIN:")
+
+
+def _is_idempotent(command) -> bool:
+    """True if the command is a setpoint that may be deduplicated"""
+    if isinstance(command, bytes):
+        command = command.decode()
+    return command.startswith(_IDEMPOTENT_PREFIXES)
+
+
 class DualMotorController:
     """Controls both motors via single Teensy 4.1"""
     
@@ -29,8 +65,30 @@ class DualMotorController:
         self.baud_rate = baud_rate
         self.serial_conn: Optional[serial.Serial] = None
         self.is_connected = False
-        self.lock = threading.Lock()
-        
+        # Incoming lines land here via the background reader thread
+        self._rx_queue: queue.Queue = queue.Queue()
+        self._reader_thread: Optional[threading.Thread] = None
+        # Outgoing (command, Future) pairs, consumed by the single writer
+        # thread - callers never touch the port directly
+        self._tx_queue: queue.Queue = queue.Queue()
+        self._tx_thread: Optional[threading.Thread] = None
+        # Reusable write buffer (only the writer thread touches it)
+        self._wbuf = bytearray(64)
+        # Raw serial fd for the hot path; pyserial stays in charge of
+        # open/close/configuration
+        self._fd: Optional[int] = None
+        # Short-window dedup of identical setpoint commands
+        self._last_cmd = None
+        self._last_cmd_ts = 0.0
+        self._last_cmd_resp: Optional[str] = None
+        # Latest streamed motor positions (see enable_stream)
+        self.positions = {1: None, 2: None}
+        # Last-sent setpoints - joysticks emit streams of nearly identical
+        # values, so redundant SPEED/direction commands are dropped here
+        self._last_speed: Optional[int] = None
+        self._last_motor_speed = {1: None, 2: None}
+        self._last_motor_dir = {1: None, 2: None}
+
     def connect(self) -> bool:
         """
         Establish serial connection to Teensy
@@ -42,15 +100,45 @@ class DualMotorController:
             self.serial_conn = serial.Serial(
                 port=self.port,
                 baudrate=self.baud_rate,
-                timeout=1,
+                timeout=0.3,
                 write_timeout=1
             )
-            time.sleep(2)  # Wait for Teensy to initialize
-            
-            # Clear any startup messages
+            # Cut the USB-CDC ~16ms buffering tick so short replies reach
+            # userspace as soon as the Teensy sends them
+            try:
+                self.serial_conn.set_low_latency_mode(True)
+            except (AttributeError, ValueError, OSError):
+                pass  # Not supported on this platform/pyserial version
+            # Active handshake instead of a flat 2s boot wait: poll with
+            # STATUS until the Teensy answers (reconnects to an already
+            # running board come up in tens of ms). The reader thread is
+            # not running yet, so reading the port directly here is safe.
+            deadline = time.monotonic() + 3.0
+            while time.monotonic() < deadline:
+                self.serial_conn.write(b"STATUS\n")
+                self.serial_conn.flush()
+                if self.serial_conn.readline():  # Blocks up to the 0.3s timeout
+                    break
+                time.sleep(0.02)
+
+            # Clear startup messages and the rest of the handshake reply
             self.serial_conn.reset_input_buffer()
-            
+
+            self._fd = self.serial_conn.fileno()
             self.is_connected = True
+            self._forget_setpoints()
+
+            # Start the background reader so Teensy output (replies and
+            # unsolicited telemetry alike) is drained continuously
+            self._reader_thread = threading.Thread(target=self._reader_loop,
+                                                   daemon=True)
+            self._reader_thread.start()
+
+            # Single writer thread: all commands go out through here
+            self._tx_thread = threading.Thread(target=self._tx_loop,
+                                               daemon=True)
+            self._tx_thread.start()
+
             print(f"✓ Connected to Teensy at {self.port}")
             
             # Get initial status
@@ -68,117 +156,365 @@ class DualMotorController:
     def disconnect(self):
         """Close serial connection"""
         if self.serial_conn and self.serial_conn.is_open:
-            self.stop_all()
-            time.sleep(0.5)
-            self.serial_conn.close()
+            # One batched ESTOP instead of stop_all + a 0.5s settle: the
+            # firmware halts the motors immediately, so once the reply is
+            # back the port can close right away
+            self.send_batch(["ESTOP"])
             self.is_connected = False
+            for thread in (self._tx_thread, self._reader_thread):
+                if thread and thread.is_alive():
+                    thread.join(timeout=1.0)
+            self.serial_conn.close()
+            self._fd = None
             print("Disconnected from Teensy")
     
     def send_command(self, command: str) -> Optional[str]:
         """
         Send command to Teensy and get response
-        
+
         Args:
-            command: Command string to send
-            
+            command: Command string, or pre-encoded bytes including the
+                trailing newline
+
         Returns:
             Response from Teensy or None if error
         """
         if not self.is_connected or not self.serial_conn:
             print("Not connected to Teensy")
             return None
-        
-        with self.lock:
+
+        # Joysticks re-emit the same setpoint many times per second -
+        # return the cached reply for an exact repeat inside the window
+        now = time.monotonic()
+        if command == self._last_cmd and now - self._last_cmd_ts < 0.05:
+            return self._last_cmd_resp
+
+        # Hand the command to the single writer thread and wait for the
+        # reply through the future - no lock, no head-of-line contention
+        future: Future = Future()
+        self._tx_queue.put((command, future))
+        try:
+            response = future.result(timeout=1.5)
+        except FutureTimeoutError:
+            response = None
+
+        if response is not None and _is_idempotent(command):
+            self._last_cmd = command
+            self._last_cmd_ts = now
+            self._last_cmd_resp = response
+        else:
+            # STOP/ESTOP and friends change state - never serve them (or
+            # anything after them) from the dedup cache
+            self._last_cmd = None
+        return response
+
+    def send_batch(self, commands: list) -> Optional[list]:
+        """
+        Send several commands in one serial write and collect all replies
+
+        The commands leave the Pi as a single '|'-joined compound frame
+        (the firmware splits it and executes each part in order), so a
+        compound action like differential drive pays one queue/write
+        cycle instead of one per command.
+
+        Args:
+            commands: Command strings to execute in order
+
+        Returns:
+            List of response lines from Teensy or None if error
+        """
+        future = self.submit_batch(commands)
+        try:
+            response = future.result(timeout=1.5 + 0.1 * len(commands))
+        except FutureTimeoutError:
+            return None
+        return response.split('\n') if response is not None else None
+
+    def submit_batch(self, commands: list) -> Future:
+        """
+        Enqueue a batch for the writer thread without blocking
+
+        Returns the Future that will carry the joined reply text (or
+        None on error). Async callers can await it directly with
+        asyncio.wrap_future instead of parking a thread in result().
+
+        Args:
+            commands: Command strings to execute in order
+        """
+        future: Future = Future()
+        if not self.is_connected or not self.serial_conn:
+            print("Not connected to Teensy")
+            future.set_result(None)
+            return future
+
+        # Batches set speeds/directions wholesale - drop the setpoint
+        # cache and the repeat-dedup entry (a STOP inside a batch must
+        # not let a cached RUN reply swallow the next real RUN)
+        self._forget_setpoints()
+        self._last_cmd = None
+
+        self._tx_queue.put((list(commands), future))
+        return future
+
+    def _tx_loop(self):
+        """Single-writer loop: the only code that writes to the port
+
+        Drains (command, Future) pairs enqueued by send_command, performs
+        the write/read transaction and delivers the response through the
+        future. With exactly one writer there is nothing for a lock to
+        protect, and queued commands go out back-to-back.
+        """
+        while self.is_connected and self.serial_conn and self.serial_conn.is_open:
             try:
-                # Send command
-                self.serial_conn.write(f"{command}\n".encode())
-                self.serial_conn.flush()
-                
-                # Read response (timeout after 1 second)
-                response_lines = []
-                start_time = time.time()
-                
-                while time.time() - start_time < 1.0:
-                    if self.serial_conn.in_waiting:
-                        line = self.serial_conn.readline().decode().strip()
-                        if line:
-                            response_lines.append(line)
-                            # For status command, read all lines
-                            if "========" in line and len(response_lines) > 1:
-                                # Read remaining status lines
-                                time.sleep(0.1)
-                                while self.serial_conn.in_waiting:
-                                    line = self.serial_conn.readline().decode().strip()
-                                    if line:
-                                        response_lines.append(line)
-                                break
-                    else:
-                        time.sleep(0.01)
-                
-                return '\n'.join(response_lines) if response_lines else None
-                
-            except Exception as e:
-                print(f"Command error - {e}")
+                command, future = self._tx_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            future.set_result(self._transact(command))
+
+    def _transact(self, command) -> Optional[str]:
+        """Write one command (or a batch of lines) and collect the reply
+
+        Runs on the writer thread only.
+        """
+        is_batch = isinstance(command, (list, tuple))
+        if is_batch:
+            # '|' compound framing: the firmware drains all available
+            # bytes into one buffer before parsing, so newline-joined
+            # commands written in a single os.write would be mashed into
+            # one unknown command. The '|' separator survives that and
+            # is split back into individual commands on the Teensy.
+            command = '|'.join(command)
+        # Hot-path commands arrive pre-encoded (bytes) or are in the
+        # static table; anything else goes through the reusable buffer
+        if isinstance(command, bytes):
+            payload = command
+        else:
+            payload = _STATIC_CMDS.get(command)
+        try:
+            # Drop stale unsolicited lines (sync warnings, boost
+            # notices) so they are not mistaken for this reply
+            while True:
+                try:
+                    self._rx_queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            # Send command, reusing one write buffer when there is no
+            # pre-encoded payload
+            if payload is None:
+                self._wbuf.clear()
+                self._wbuf.extend(command.encode())
+                self._wbuf.append(0x0A)
+                payload = self._wbuf
+            # Write straight to the fd - skips pyserial's Python-level
+            # wrapper and lock on every command
+            view = memoryview(payload)
+            sent = 0
+            while sent < len(view):
+                sent += os.write(self._fd, view[sent:])
+            # No flush()/tcdrain here: the kernel queues the write and the
+            # blocking reply read below is the real sync point, so the UART
+            # transmit overlaps with preparing for the response
+
+            # Wait for the reply on the reader thread's queue (no
+            # direct serial reads here)
+            try:
+                first = self._rx_queue.get(timeout=1.0)
+            except queue.Empty:
                 return None
-    
+
+            response_lines = [first]
+            # Grab whatever else has already been queued
+            while True:
+                try:
+                    response_lines.append(self._rx_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Batch and status replies span multiple lines that may still
+            # be in flight - keep collecting with a short per-line wait
+            # until the port goes quiet (status lines stream with larger
+            # gaps, so give them a little longer)
+            is_status = any("========" in line for line in response_lines)
+            if is_batch or is_status:
+                quiet_window = 0.1 if is_status else 0.05
+                while True:
+                    try:
+                        response_lines.append(self._rx_queue.get(timeout=quiet_window))
+                    except queue.Empty:
+                        break
+
+            return '\n'.join(response_lines)
+
+        except Exception as e:
+            print(f"Command error - {e}")
+            return None
+
+    def _reader_loop(self):
+        """Background reader: pull lines off the serial port into a queue
+
+        Runs as a daemon thread for the lifetime of the connection so the
+        port is drained continuously; command replies are consumed from
+        the queue by send_command. Read-readiness comes from a selector
+        (epoll on Linux), so additional serial devices could be
+        registered on the same loop instead of needing a thread each.
+        """
+        sel = selectors.DefaultSelector()
+        try:
+            sel.register(self.serial_conn.fileno(), selectors.EVENT_READ)
+        except (OSError, ValueError):
+            return
+
+        # Persistent accumulator: chunks are appended in place and
+        # consumed lines deleted from the front, so partial lines never
+        # force a fresh bytes copy of the whole backlog per read
+        buffer = bytearray()
+        try:
+            while self.is_connected and self.serial_conn and self.serial_conn.is_open:
+                if not sel.select(timeout=0.1):
+                    continue  # Periodic wakeup to re-check the connection
+                try:
+                    # Raw read on the ready fd - one syscall, no pyserial
+                    # wrapper overhead
+                    data = os.read(self._fd, 4096)
+                except (OSError, serial.SerialException):
+                    break
+                if not data:
+                    continue
+                buffer.extend(data)
+                while True:
+                    newline = buffer.find(b'\n')
+                    if newline < 0:
+                        break
+                    decoded = buffer[:newline].decode(errors='replace').strip()
+                    del buffer[:newline + 1]
+                    if not decoded:
+                        continue
+                    if decoded.startswith("POS:"):
+                        # Unsolicited position stream - cache, don't queue
+                        self._handle_position_line(decoded)
+                    else:
+                        self._rx_queue.put(decoded)
+        finally:
+            sel.close()
+
+    def _handle_position_line(self, line: str):
+        """Cache a streamed POS:<m1>:<m2> line from the Teensy"""
+        try:
+            _, pos1, pos2 = line.split(":")
+            self.positions[1] = int(pos1)
+            self.positions[2] = int(pos2)
+        except ValueError:
+            pass  # Malformed line - ignore
+
+    @staticmethod
+    def _quantize_speed(speed: float) -> int:
+        """Clamp and quantize a speed to 25 steps/sec granularity"""
+        speed = int(max(0, min(speed, 20000)))  # Max 20000 steps/sec with 8x microstepping
+        return speed - speed % 25
+
+    def _forget_setpoints(self):
+        """Invalidate cached setpoints after commands that change them on the Teensy"""
+        self._last_speed = None
+        self._last_motor_speed = {1: None, 2: None}
+        self._last_motor_dir = {1: None, 2: None}
+
+    def send_compound(self, parts: list) -> Optional[str]:
+        """
+        Send several commands to the Teensy as a single '|'-joined frame
+
+        The firmware splits the frame on '|' and executes each part in
+        order, so a compound move costs one serial round-trip instead
+        of one per command.
+
+        Args:
+            parts: Command strings to execute in order
+
+        Returns:
+            Response from Teensy or None if error
+        """
+        return self.send_command("|".join(parts))
+
     # Both Motors Commands
     def set_speed_both(self, speed: float) -> bool:
         """Set speed for both motors"""
-        speed = max(0, min(speed, 20000))  # Max 20000 steps/sec with 8x microstepping
-        response = self.send_command(f"SPEED:{speed}")
-        return response is not None
-    
+        speed = self._quantize_speed(speed)
+        if speed == self._last_speed:
+            return True  # Teensy already has this speed
+        response = self.send_command(_encode_speed("SPEED", speed))
+        if response is None:
+            return False
+        self._last_speed = speed
+        self._last_motor_speed = {1: speed, 2: speed}
+        return True
+
     def move_forward(self, speed: float) -> bool:
         """Move both motors forward at specified speed"""
-        self.send_command("FORWARD")
-        self.set_speed_both(speed)
-        self.send_command("RUN")
+        speed = self._quantize_speed(speed)
+        response = self.send_compound(["FORWARD", f"SPEED:{speed}", "RUN"])
+        if response is None:
+            return False
+        self._last_speed = speed
+        self._last_motor_speed = {1: speed, 2: speed}
+        self._last_motor_dir = {1: "FORWARD", 2: "FORWARD"}
         return True
-    
+
     def move_backward(self, speed: float) -> bool:
         """Move both motors backward at specified speed"""
-        self.send_command("BACKWARD")
-        self.set_speed_both(speed)
-        self.send_command("RUN")
+        speed = self._quantize_speed(speed)
+        response = self.send_compound(["BACKWARD", f"SPEED:{speed}", "RUN"])
+        if response is None:
+            return False
+        self._last_speed = speed
+        self._last_motor_speed = {1: speed, 2: speed}
+        self._last_motor_dir = {1: "BACKWARD", 2: "BACKWARD"}
         return True
     
     def spin_left(self, speed: float) -> bool:
         """Spin left - point turn (M1 back, M2 forward)"""
+        self._forget_setpoints()
         response = self.send_command(f"SPIN:LEFT:{speed}")
         return response is not None
-    
+
     def spin_right(self, speed: float) -> bool:
         """Spin right - point turn (M1 forward, M2 back)"""
+        self._forget_setpoints()
         response = self.send_command(f"SPIN:RIGHT:{speed}")
         return response is not None
-    
+
     def boost_spin_left(self, speed: float) -> bool:
         """Boosted spin left with initial speed burst"""
+        self._forget_setpoints()
         response = self.send_command(f"BOOST:LEFT:{speed}")
         return response is not None
-    
+
     def boost_spin_right(self, speed: float) -> bool:
         """Boosted spin right with initial speed burst"""
+        self._forget_setpoints()
         response = self.send_command(f"BOOST:RIGHT:{speed}")
         return response is not None
-    
+
     def boost_forward(self, speed: float) -> bool:
         """Boosted forward movement"""
+        self._forget_setpoints()
         response = self.send_command(f"BOOST:FORWARD:{speed}")
         return response is not None
-    
+
     def boost_backward(self, speed: float) -> bool:
         """Boosted backward movement"""
+        self._forget_setpoints()
         response = self.send_command(f"BOOST:BACKWARD:{speed}")
         return response is not None
-    
+
     def stop_all(self) -> bool:
         """Stop both motors (gradual)"""
+        self._forget_setpoints()  # STOP zeroes target speeds on the Teensy
         response = self.send_command("STOP")
         return response is not None
-    
+
     def emergency_stop(self) -> bool:
         """Emergency stop both motors (immediate)"""
+        self._forget_setpoints()
         response = self.send_command("ESTOP")
         return response is not None
     
@@ -188,9 +524,32 @@ class DualMotorController:
     
     def reset_all(self) -> bool:
         """Reset both motor position counters"""
+        self._forget_setpoints()  # RESET also stops the motors
         response = self.send_command("RESET")
         return response is not None
     
+    def enable_stream(self, hz: int = 10) -> bool:
+        """
+        Enable the Teensy's unsolicited position stream
+
+        The firmware then emits POS:<m1>:<m2> lines at the given rate and
+        the reader thread caches them, so get_positions() costs no I/O.
+
+        Args:
+            hz: Stream rate in updates per second (1-100)
+        """
+        response = self.send_command(f"STREAM:{int(hz)}")
+        return response is not None
+
+    def disable_stream(self) -> bool:
+        """Disable the unsolicited position stream"""
+        response = self.send_command("STREAM:0")
+        return response is not None
+
+    def get_positions(self):
+        """Latest streamed motor positions (None until the stream reports)"""
+        return self.positions[1], self.positions[2]
+
     def sync_motors(self) -> bool:
         """Synchronize both motor positions"""
         response = self.send_command("SYNC")
@@ -212,15 +571,26 @@ class DualMotorController:
     # Individual Motor Commands
     def set_motor_speed(self, motor_num: int, speed: float) -> bool:
         """Set speed for individual motor (1 or 2)"""
-        speed = max(0, min(speed, 20000))  # Max 20000 steps/sec with 8x microstepping
-        response = self.send_command(f"M{motor_num}:SPEED:{speed}")
-        return response is not None
-    
+        speed = self._quantize_speed(speed)
+        if speed == self._last_motor_speed.get(motor_num):
+            return True
+        response = self.send_command(_encode_speed(f"M{motor_num}:SPEED", speed))
+        if response is None:
+            return False
+        self._last_motor_speed[motor_num] = speed
+        self._last_speed = None  # Per-motor speeds now differ from the shared setpoint
+        return True
+
     def set_motor_direction(self, motor_num: int, forward: bool = True) -> bool:
         """Set direction for individual motor"""
         direction = "FORWARD" if forward else "BACKWARD"
+        if direction == self._last_motor_dir.get(motor_num):
+            return True
         response = self.send_command(f"M{motor_num}:{direction}")
-        return response is not None
+        if response is None:
+            return False
+        self._last_motor_dir[motor_num] = direction
+        return True
     
     def run_motor(self, motor_num: int) -> bool:
         """Start individual motor"""
@@ -229,6 +599,8 @@ class DualMotorController:
     
     def stop_motor(self, motor_num: int) -> bool:
         """Stop individual motor"""
+        self._last_motor_speed[motor_num] = None  # STOP zeroes this motor's target
+        self._last_speed = None
         response = self.send_command(f"M{motor_num}:STOP")
         return response is not None
 
@@ -273,122 +645,172 @@ def main():
         print("  r - Reset positions")
         print("  q - Quit")
         
-        current_speed = 2000  # Starting speed (equivalent to old 250 steps/sec in 1x)
+        state = {'speed': 2000}  # Mutable so key handlers can adjust it
         speed_increment = 1000  # Larger increment for 8x microstepping
-        
-        print(f"\nCurrent speed: {current_speed} steps/sec")
-        print("Ready for commands...")
-        
-        while True:
-            cmd = input("\nCommand: ").strip()  # No .lower() to preserve case
-            
-            if cmd == 'f':
-                print(f"Moving forward at {current_speed} steps/sec")
-                controller.move_forward(current_speed)
-                
-            elif cmd == 's':
-                print(f"Moving backward at {current_speed} steps/sec")
-                controller.move_backward(current_speed)
-                
-            elif cmd == 'a':
-                print(f"Spinning left at {current_speed} steps/sec")
-                controller.spin_left(current_speed)
-                
-            elif cmd == 'd':
-                print(f"Spinning right at {current_speed} steps/sec")
-                controller.spin_right(current_speed)
-                
-            elif cmd == 'v':
-                print(f"BOOST forward at {current_speed} steps/sec")
-                controller.boost_forward(current_speed)
-                
-            elif cmd == 'x':
-                print(f"BOOST backward at {current_speed} steps/sec")
-                controller.boost_backward(current_speed)
-                
-            elif cmd == 'z':
-                print(f"BOOST spin left at {current_speed} steps/sec")
-                controller.boost_spin_left(current_speed)
-                
-            elif cmd == 'c':
-                print(f"BOOST spin right at {current_speed} steps/sec")
-                controller.boost_spin_right(current_speed)
-                
-            elif cmd == 'w':
-                print("Stopping motors...")
-                controller.stop_all()
-                
-            elif cmd == 'e':
-                print("EMERGENCY STOP!")
-                controller.emergency_stop()
-                
-            elif cmd == '+':
-                current_speed = min(current_speed + speed_increment, 20000)
-                controller.set_speed_both(current_speed)
-                print(f"Speed increased to {current_speed} steps/sec")
-                
-            elif cmd == '-':
-                current_speed = max(current_speed - speed_increment, 100)
-                controller.set_speed_both(current_speed)
-                print(f"Speed decreased to {current_speed} steps/sec")
-                
-            elif cmd == '?':
-                status = controller.get_status()
-                print(status if status else "No response")
-                
-            elif cmd == 'r':
-                print("Resetting positions...")
-                controller.reset_all()
-                
-            elif cmd == 'y':
-                print("Synchronizing motors...")
-                controller.sync_motors()
-                
-            elif cmd == '1':
-                # Motor 1 control mode
-                print("\n--- Motor 1 Control Mode ---")
-                m1_cmd = input("Motor 1 (f=forward, b=back, x=stop): ").lower()
-                if m1_cmd == 'f':
-                    controller.set_motor_direction(1, True)
-                    controller.set_motor_speed(1, current_speed)
-                    controller.run_motor(1)
-                    print(f"Motor 1 forward at {current_speed}")
-                elif m1_cmd == 'b':
-                    controller.set_motor_direction(1, False)
-                    controller.set_motor_speed(1, current_speed)
-                    controller.run_motor(1)
-                    print(f"Motor 1 backward at {current_speed}")
-                elif m1_cmd == 'x':
-                    controller.stop_motor(1)
-                    print("Motor 1 stopped")
-                    
-            elif cmd == '2':
-                # Motor 2 control mode
-                print("\n--- Motor 2 Control Mode ---")
-                m2_cmd = input("Motor 2 (f=forward, b=back, x=stop): ").lower()
-                if m2_cmd == 'f':
-                    controller.set_motor_direction(2, True)
-                    controller.set_motor_speed(2, current_speed)
-                    controller.run_motor(2)
-                    print(f"Motor 2 forward at {current_speed}")
-                elif m2_cmd == 'b':
-                    controller.set_motor_direction(2, False)
-                    controller.set_motor_speed(2, current_speed)
-                    controller.run_motor(2)
-                    print(f"Motor 2 backward at {current_speed}")
-                elif m2_cmd == 'x':
-                    controller.stop_motor(2)
-                    print("Motor 2 stopped")
-                
-            elif cmd == 'q':
-                print("Shutting down...")
-                controller.stop_all()
-                time.sleep(1)
-                break
-                
+
+        def move_forward():
+            print(f"Moving forward at {state['speed']} steps/sec")
+            controller.move_forward(state['speed'])
+
+        def move_backward():
+            print(f"Moving backward at {state['speed']} steps/sec")
+            controller.move_backward(state['speed'])
+
+        def spin_left():
+            print(f"Spinning left at {state['speed']} steps/sec")
+            controller.spin_left(state['speed'])
+
+        def spin_right():
+            print(f"Spinning right at {state['speed']} steps/sec")
+            controller.spin_right(state['speed'])
+
+        def boost_forward():
+            print(f"BOOST forward at {state['speed']} steps/sec")
+            controller.boost_forward(state['speed'])
+
+        def boost_backward():
+            print(f"BOOST backward at {state['speed']} steps/sec")
+            controller.boost_backward(state['speed'])
+
+        def boost_left():
+            print(f"BOOST spin left at {state['speed']} steps/sec")
+            controller.boost_spin_left(state['speed'])
+
+        def boost_right():
+            print(f"BOOST spin right at {state['speed']} steps/sec")
+            controller.boost_spin_right(state['speed'])
+
+        def stop():
+            print("Stopping motors...")
+            controller.stop_all()
+
+        def estop():
+            print("EMERGENCY STOP!")
+            controller.emergency_stop()
+
+        def speed_up():
+            state['speed'] = min(state['speed'] + speed_increment, 20000)
+            controller.set_speed_both(state['speed'])
+            print(f"Speed increased to {state['speed']} steps/sec")
+
+        def speed_down():
+            state['speed'] = max(state['speed'] - speed_increment, 100)
+            controller.set_speed_both(state['speed'])
+            print(f"Speed decreased to {state['speed']} steps/sec")
+
+        def show_status():
+            status = controller.get_status()
+            print(status if status else "No response")
+
+        def reset_positions():
+            print("Resetting positions...")
+            controller.reset_all()
+
+        def sync():
+            print("Synchronizing motors...")
+            controller.sync_motors()
+
+        dispatch = {
+            'f': move_forward,
+            's': move_backward,
+            'a': spin_left,
+            'd': spin_right,
+            'v': boost_forward,
+            'x': boost_backward,
+            'z': boost_left,
+            'c': boost_right,
+            'w': stop,
+            'e': estop,
+            '+': speed_up,
+            '-': speed_down,
+            '?': show_status,
+            'r': reset_positions,
+            'y': sync,
+        }
+
+        def handle_motor_key(motor_num, key):
+            """Apply an f/b/x key to an individual motor"""
+            if key == 'f':
+                controller.set_motor_direction(motor_num, True)
+                controller.set_motor_speed(motor_num, state['speed'])
+                controller.run_motor(motor_num)
+                print(f"Motor {motor_num} forward at {state['speed']}")
+            elif key == 'b':
+                controller.set_motor_direction(motor_num, False)
+                controller.set_motor_speed(motor_num, state['speed'])
+                controller.run_motor(motor_num)
+                print(f"Motor {motor_num} backward at {state['speed']}")
+            elif key == 'x':
+                controller.stop_motor(motor_num)
+                print(f"Motor {motor_num} stopped")
             else:
-                print(f"Unknown command: {cmd}")
-    
+                print(f"Motor {motor_num}: unknown key '{key}' (use f/b/x)")
+
+        print(f"\nCurrent speed: {state['speed']} steps/sec")
+        print("Ready for commands (keys act immediately, q quits)...")
+
+        if not sys.stdin.isatty():
+            # Piped/scripted input: iterate stdin line-buffered and
+            # dispatch through the same table - lets automation drive the
+            # controller without any tty handling (use '1f', '2x', ...
+            # for the individual-motor commands)
+            for line in sys.stdin:
+                cmd = line.strip()
+                if not cmd:
+                    continue
+                if cmd == 'q':
+                    print("Shutting down...")
+                    controller.stop_all()
+                    time.sleep(1)
+                    break
+                if len(cmd) == 2 and cmd[0] in ('1', '2'):
+                    handle_motor_key(int(cmd[0]), cmd[1])
+                elif cmd in dispatch:
+                    dispatch[cmd]()
+                elif cmd in ('1', '2'):
+                    print(f"Motor {cmd}: append f/b/x (e.g. {cmd}f)")
+                else:
+                    print(f"Unknown command: {cmd}")
+            return
+
+        # Non-blocking keyboard loop: stdin goes into cbreak mode and is
+        # polled through a selector, so keys act the moment they are
+        # pressed and the loop stays free between keystrokes instead of
+        # being parked inside input()
+        stdin_fd = sys.stdin.fileno()
+        old_tty_attrs = termios.tcgetattr(stdin_fd)
+        key_sel = selectors.DefaultSelector()
+        key_sel.register(sys.stdin, selectors.EVENT_READ)
+        pending_motor = None  # Set while waiting for a motor submode key
+
+        try:
+            tty.setcbreak(stdin_fd)
+            while True:
+                if not key_sel.select(timeout=0.5):
+                    continue  # Idle wakeup - nothing typed
+                key = sys.stdin.read(1)
+                if not key:
+                    break  # EOF
+
+                if pending_motor is not None:
+                    motor_num, pending_motor = pending_motor, None
+                    handle_motor_key(motor_num, key)
+                elif key == 'q':
+                    print("Shutting down...")
+                    controller.stop_all()
+                    time.sleep(1)
+                    break
+                elif key in ('1', '2'):
+                    pending_motor = int(key)
+                    print(f"--- Motor {key}: press f=forward, b=back, x=stop ---")
+                elif key in dispatch:
+                    dispatch[key]()
+                elif key not in ('\n', '\r', ' '):
+                    print(f"Unknown command: {key}")
+        finally:
+            key_sel.close()
+            termios.tcsetattr(stdin_fd, termios.TCSADRAIN, old_tty_attrs)
+
     except KeyboardInterrupt:
         print("\n\nInterrupted by user")
         controller.emergency_stop()
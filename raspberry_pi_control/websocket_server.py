@@ -12,15 +12,40 @@ import asyncio
 import websockets
 import json
 import logging
+import re
+import time
 from motor_controller import DualMotorController
-from typing import Set
+from weakref import WeakSet
 import signal
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None  # Optional - stdlib event loop still works
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # Optional - stdlib json still works
+
+if orjson is not None:
+    def _json_dumps(obj) -> str:
+        # orjson emits bytes; the browser client expects text frames,
+        # so decode - still several times faster than stdlib json
+        return orjson.dumps(obj).decode()
+    _json_loads = orjson.loads
+else:
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+
 # Configuration
 WEBSOCKET_HOST = '0.0.0.0'  # Listen on all interfaces
 WEBSOCKET_PORT = 8765
 TEENSY_PORT = '/dev/ttyACM0'
 
+# Pulls the drift figure out of the Teensy's STATUS text in one scan
+_DRIFT_RE = re.compile(r'Sync Drift:\s*(-?\d+)')
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -30,7 +55,9 @@ logger = logging.getLogger(__name__)
 
 # Global state
 controller = None
-connected_clients: Set[websockets.WebSocketServerProtocol] = set()
+# Weak references: a connection that dies anywhere drops out of the set
+# on its own, so no handler has to remember to discard it
+connected_clients: WeakSet = WeakSet()
 current_state = {
     'speed': 0,
     'direction': 'STOPPED',
@@ -43,29 +70,93 @@ class JoystickServer:
         """Initialize joystick server"""
         self.controller = DualMotorController(teensy_port)
         self.running = False
-        
+        # Serial submissions funnel through this queue to one writer task
+        self.cmd_queue: asyncio.Queue = asyncio.Queue()
+        self._writer_task = None
+        # Joystick coalescing: newest unsent target plus the one last
+        # acted on, drained by the flush loop at a bounded rate
+        self._pending_control = None  # (websocket, command) or None
+        self._last_control = None
+        self._flush_task = None
+        # Serialized status payload, reused while the state is unchanged
+        self._last_status_key = None
+        self._last_status_msg = None
+
     async def start(self):
         """Start the server"""
         # Connect to Teensy
         if not self.controller.connect():
             logger.error("Failed to connect to Teensy!")
             return False
-        
-        logger.info(f"✓ Connected to Teensy at {TEENSY_PORT}")
+
+        logger.info("✓ Connected to Teensy at %s", TEENSY_PORT)
         self.running = True
+        self._writer_task = asyncio.create_task(self._writer_loop())
+        self._flush_task = asyncio.create_task(self._flush_loop())
         return True
+
+    async def _flush_loop(self):
+        """Send the freshest joystick target at most every 20 ms
+
+        Browser joysticks fire at 60-120 Hz but the Teensy only needs
+        the newest target, so bursts collapse to at most one serial
+        action per tick, and targets identical to the last one acted on
+        are skipped entirely.
+        """
+        while self.running:
+            await asyncio.sleep(0.02)
+            try:
+                pending, self._pending_control = self._pending_control, None
+                if pending is None:
+                    continue
+                websocket, command = pending
+                if command == self._last_control:
+                    continue  # Target unchanged - nothing new to send
+                self._last_control = command
+                await self._apply_motor_control(websocket, command)
+            except Exception as e:
+                # A malformed target or dead client must not kill the
+                # flush task - that would drop all joystick input until
+                # the server restarts
+                logger.error("Flush loop error: %s", e)
+
+    async def _writer_loop(self):
+        """Single writer task: the only path onto the serial link
+
+        Client handlers enqueue (commands, future) pairs and await the
+        future, so a slow serial round-trip never piles handlers up on
+        thread-pool workers contending for the port.
+        """
+        while self.running:
+            commands, fut = await self.cmd_queue.get()
+            try:
+                # Await the controller's writer-thread future directly -
+                # no thread-pool hop per submission
+                raw = await asyncio.wrap_future(
+                    self.controller.submit_batch(commands))
+                if not fut.done():
+                    fut.set_result(raw.split('\n') if raw is not None else None)
+            except Exception as e:
+                if not fut.done():
+                    fut.set_exception(e)
+
+    async def _submit(self, commands: list):
+        """Queue commands for the writer task and await the reply lines"""
+        fut = asyncio.get_running_loop().create_future()
+        await self.cmd_queue.put((commands, fut))
+        return await fut
     
     async def handle_client(self, websocket):
         """Handle a new WebSocket client connection"""
         client_id = f"{websocket.remote_address[0]}:{websocket.remote_address[1]}"
-        logger.info(f"New client connected: {client_id}")
+        logger.info("New client connected: %s", client_id)
         
         # Add to connected clients
         connected_clients.add(websocket)
         
         try:
             # Send initial connection confirmation
-            await websocket.send(json.dumps({
+            await websocket.send(_json_dumps({
                 'type': 'response',
                 'message': 'Connected to Raspberry Pi motor controller'
             }))
@@ -75,36 +166,49 @@ class JoystickServer:
                 try:
                     await self.process_message(websocket, message)
                 except Exception as e:
-                    logger.error(f"Error processing message: {e}")
-                    await websocket.send(json.dumps({
+                    logger.error("Error processing message: %s", e)
+                    await websocket.send(_json_dumps({
                         'type': 'error',
                         'message': str(e)
                     }))
         
         except websockets.exceptions.ConnectionClosed:
-            logger.info(f"Client disconnected: {client_id}")
+            logger.info("Client disconnected: %s", client_id)
         except Exception as e:
-            logger.error(f"Unexpected error in client handler: {e}")
+            logger.error("Unexpected error in client handler: %s", e)
         
         finally:
-            connected_clients.discard(websocket)
             # Stop motors when client disconnects (non-blocking)
             try:
-                await asyncio.to_thread(self.controller.stop_all)
-                logger.info(f"Motors stopped - client {client_id} disconnected")
+                # This STOP bypasses the flush loop, so its repeat
+                # suppression must forget the last applied target - and
+                # any not-yet-flushed target must die too, or the next
+                # tick would restart the motors with no client attached
+                self._pending_control = None
+                self._last_control = None
+                await self._submit(["STOP"])
+                logger.info("Motors stopped - client %s disconnected", client_id)
             except Exception as e:
-                logger.error(f"Error stopping motors on disconnect: {e}")
+                logger.error("Error stopping motors on disconnect: %s", e)
     
     async def process_message(self, websocket, message: str):
         """Process incoming WebSocket message"""
         try:
-            data = json.loads(message)
+            data = _json_loads(message)
             msg_type = data.get('type')
             
             if msg_type == 'command':
                 # Direct serial command
                 command = data.get('command')
-                logger.info(f"Direct command: {command}")
+                logger.info("Direct command: %s", command)
+
+                # Direct commands change motor state behind the flush
+                # loop's back - forget its last applied target so a
+                # repeat of the same joystick value is not skipped, and
+                # drop any queued target so a STOP is not overridden by
+                # a joystick packet that arrived just before it
+                self._pending_control = None
+                self._last_control = None
                 
                 # Handle compound commands for smooth real-time control
                 if command.startswith('MOVE:'):
@@ -113,9 +217,9 @@ class JoystickServer:
                     await self.handle_diff_command(command)
                 else:
                     # Send direct command to Teensy
-                    response = await asyncio.to_thread(self.controller.send_command, command)
+                    response = await self._submit([command])
                 
-                await websocket.send(json.dumps({
+                await websocket.send(_json_dumps({
                     'type': 'response',
                     'message': 'Command sent'
                 }))
@@ -125,45 +229,51 @@ class JoystickServer:
                 await self.handle_motor_control(websocket, data.get('command'))
             
             else:
-                logger.warning(f"Unknown message type: {msg_type}")
+                logger.warning("Unknown message type: %s", msg_type)
         
-        except json.JSONDecodeError:
-            logger.error(f"Invalid JSON: {message}")
+        except ValueError:  # JSONDecodeError in both json and orjson
+            logger.error("Invalid JSON: %s", message)
         except Exception as e:
-            logger.error(f"Error processing message: {e}")
+            logger.error("Error processing message: %s", e)
     
     async def handle_motor_control(self, websocket, command: dict):
-        """Handle motor control commands from joystick"""
-        cmd_type = command.get('type')
-        
+        """Record the newest joystick target; the flush loop sends it"""
+        self._pending_control = (websocket, command)
+
+    async def _apply_motor_control(self, websocket, command: dict):
+        """Translate a joystick target into motor commands"""
         try:
+            # Inside the try: a message without a command dict stores
+            # None here, and .get on it must not escape to the caller
+            cmd_type = command.get('type')
+
             if cmd_type == 'forward':
                 speed = command.get('speed', 2000)
-                await asyncio.to_thread(self.controller.move_forward, speed)
+                await self._submit(["FORWARD", f"SPEED:{int(speed)}", "RUN"])
                 current_state['speed'] = speed
                 current_state['direction'] = 'FORWARD'
-                logger.debug(f"Forward at {speed} steps/sec")
-            
+                logger.debug("Forward at %s steps/sec", speed)
+
             elif cmd_type == 'backward':
                 speed = command.get('speed', 2000)
-                await asyncio.to_thread(self.controller.move_backward, speed)
+                await self._submit(["BACKWARD", f"SPEED:{int(speed)}", "RUN"])
                 current_state['speed'] = speed
                 current_state['direction'] = 'BACKWARD'
-                logger.debug(f"Backward at {speed} steps/sec")
-            
+                logger.debug("Backward at %s steps/sec", speed)
+
             elif cmd_type == 'spin':
                 direction = command.get('direction')
                 speed = command.get('speed', 2000)
-                
+
                 if direction == 'left':
-                    await asyncio.to_thread(self.controller.spin_left, speed)
+                    await self._submit([f"SPIN:LEFT:{int(speed)}"])
                     current_state['direction'] = 'SPIN LEFT'
                 elif direction == 'right':
-                    await asyncio.to_thread(self.controller.spin_right, speed)
+                    await self._submit([f"SPIN:RIGHT:{int(speed)}"])
                     current_state['direction'] = 'SPIN RIGHT'
                 
                 current_state['speed'] = speed
-                logger.debug(f"Spin {direction} at {speed} steps/sec")
+                logger.debug("Spin %s at %s steps/sec", direction, speed)
             
             elif cmd_type == 'differential':
                 # Differential drive for smooth turning
@@ -171,25 +281,22 @@ class JoystickServer:
                 left_speed = command.get('leftSpeed', 2000)
                 right_speed = command.get('rightSpeed', 2000)
                 
-                # Set individual motor speeds (run in thread to avoid blocking)
-                await asyncio.to_thread(self.controller.set_motor_speed, 1, int(left_speed))
-                await asyncio.to_thread(self.controller.set_motor_speed, 2, int(right_speed))
-                
+                # One batched write instead of five sequential round-trips
+                commands = [f"M1:SPEED:{int(left_speed)}",
+                            f"M2:SPEED:{int(right_speed)}"]
                 if direction == 'forward':
-                    await asyncio.to_thread(self.controller.send_command, "M1:FORWARD")
-                    await asyncio.to_thread(self.controller.send_command, "M2:FORWARD")
+                    commands += ["M1:FORWARD", "M2:FORWARD"]
                 elif direction == 'backward':
-                    await asyncio.to_thread(self.controller.send_command, "M1:BACKWARD")
-                    await asyncio.to_thread(self.controller.send_command, "M2:BACKWARD")
-                
-                await asyncio.to_thread(self.controller.send_command, "RUN")
+                    commands += ["M1:BACKWARD", "M2:BACKWARD"]
+                commands.append("RUN")
+                await self._submit(commands)
                 
                 current_state['speed'] = int((left_speed + right_speed) / 2)
                 current_state['direction'] = f"DIFF {direction.upper()}"
-                logger.debug(f"Differential {direction}: L={left_speed}, R={right_speed}")
+                logger.debug("Differential %s: L=%s, R=%s", direction, left_speed, right_speed)
             
             elif cmd_type == 'stop':
-                await asyncio.to_thread(self.controller.stop_all)
+                await self._submit(["STOP"])
                 current_state['speed'] = 0
                 current_state['direction'] = 'STOPPED'
                 logger.debug("Motors stopped")
@@ -198,108 +305,123 @@ class JoystickServer:
             await self.broadcast_status()
         
         except Exception as e:
-            logger.error(f"Motor control error: {e}")
-            await websocket.send(json.dumps({
-                'type': 'error',
-                'message': f"Motor control error: {str(e)}"
-            }))
+            logger.error("Motor control error: %s", e)
+            try:
+                await websocket.send(_json_dumps({
+                    'type': 'error',
+                    'message': f"Motor control error: {str(e)}"
+                }))
+            except websockets.exceptions.ConnectionClosed:
+                pass  # Client already gone - nobody to notify
     
     async def handle_move_command(self, command: str):
         """Handle compound MOVE commands: MOVE:FORWARD:5000 or MOVE:BACKWARD:3000"""
         try:
             parts = command.split(':')
             if len(parts) != 3:
-                logger.error(f"Invalid MOVE command format: {command}")
+                logger.error("Invalid MOVE command format: %s", command)
                 return
             
             _, direction, speed = parts
             speed = int(speed)
             
-            # Send atomically to Teensy
-            await asyncio.to_thread(self.controller.send_command, f"SPEED:{speed}")
-            await asyncio.to_thread(self.controller.send_command, direction.upper())
-            await asyncio.to_thread(self.controller.send_command, "RUN")
+            # Send atomically to Teensy in one batched write
+            await self._submit([f"SPEED:{speed}", direction.upper(), "RUN"])
             
             current_state['speed'] = speed
             current_state['direction'] = direction.upper()
-            logger.debug(f"Move {direction} at {speed} steps/sec")
+            logger.debug("Move %s at %s steps/sec", direction, speed)
             
         except Exception as e:
-            logger.error(f"Error in handle_move_command: {e}")
+            logger.error("Error in handle_move_command: %s", e)
     
     async def handle_diff_command(self, command: str):
         """Handle differential steering: DIFF:FORWARD:4000:6000 or DIFF:BACKWARD:3000:5000"""
         try:
             parts = command.split(':')
             if len(parts) != 4:
-                logger.error(f"Invalid DIFF command format: {command}")
+                logger.error("Invalid DIFF command format: %s", command)
                 return
             
             _, direction, left_speed, right_speed = parts
             left_speed = int(left_speed)
             right_speed = int(right_speed)
             
-            # Send atomically to Teensy
-            await asyncio.to_thread(self.controller.send_command, f"M1:SPEED:{left_speed}")
-            await asyncio.to_thread(self.controller.send_command, f"M2:SPEED:{right_speed}")
-            await asyncio.to_thread(self.controller.send_command, f"M1:{direction.upper()}")
-            await asyncio.to_thread(self.controller.send_command, f"M2:{direction.upper()}")
-            await asyncio.to_thread(self.controller.send_command, "RUN")
+            # Send atomically to Teensy in one batched write
+            await self._submit([f"M1:SPEED:{left_speed}",
+                                f"M2:SPEED:{right_speed}",
+                                f"M1:{direction.upper()}",
+                                f"M2:{direction.upper()}",
+                                "RUN"])
             
             current_state['speed'] = int((left_speed + right_speed) / 2)
             current_state['direction'] = f"DIFF {direction.upper()}"
-            logger.debug(f"Diff {direction}: L={left_speed}, R={right_speed}")
+            logger.debug("Diff %s: L=%s, R=%s", direction, left_speed, right_speed)
             
         except Exception as e:
-            logger.error(f"Error in handle_diff_command: {e}")
+            logger.error("Error in handle_diff_command: %s", e)
     
     async def broadcast_status(self):
         """Broadcast current status to all connected clients"""
         if not connected_clients:
             return
         
-        status_msg = json.dumps({
-            'type': 'status',
-            'speed': current_state['speed'],
-            'direction': current_state['direction'],
-            'syncDrift': current_state['syncDrift']
-        })
-        
-        # Send to all connected clients
-        disconnected = set()
-        for client in connected_clients:
-            try:
-                await client.send(status_msg)
-            except websockets.exceptions.ConnectionClosed:
-                disconnected.add(client)
+        # Re-serialize only when the state actually changed; periodic
+        # broadcasts of an idle state reuse the cached payload
+        key = (current_state['speed'], current_state['direction'],
+               current_state['syncDrift'])
+        if key == self._last_status_key:
+            status_msg = self._last_status_msg
+        else:
+            status_msg = _json_dumps({
+                'type': 'status',
+                'speed': current_state['speed'],
+                'direction': current_state['direction'],
+                'syncDrift': current_state['syncDrift']
+            })
+            self._last_status_key = key
+            self._last_status_msg = status_msg
         
-        # Remove disconnected clients
-        connected_clients.difference_update(disconnected)
+        # Fan out to all clients in parallel - total latency is the
+        # slowest single send, not the sum of them. Closed connections
+        # just fail their send and fall out of the WeakSet on their own.
+        await asyncio.gather(
+            *(client.send(status_msg) for client in list(connected_clients)),
+            return_exceptions=True
+        )
     
     async def status_update_loop(self):
         """Periodically request status from Teensy and broadcast to clients"""
+        # Tick on a fixed 2s grid: sleep for what is left of the period
+        # after the STATUS round-trip, so the cadence is 2s rather than
+        # 2s + round-trip time
+        next_tick = time.monotonic()
         while self.running:
             try:
                 # Request status from Teensy (non-blocking)
-                status = await asyncio.to_thread(self.controller.get_status)
-                
-                if status and 'Sync Drift:' in status:
-                    # Parse sync drift from status
-                    lines = status.split('\n')
-                    for line in lines:
-                        if 'Sync Drift:' in line:
-                            drift_str = line.split(':')[1].strip().split()[0]
-                            current_state['syncDrift'] = int(drift_str)
-                            break
+                lines = await self._submit(["STATUS"])
+
+                if lines:
+                    # Parse sync drift from status in a single regex scan
+                    match = _DRIFT_RE.search('\n'.join(lines))
+                    if match:
+                        current_state['syncDrift'] = int(match.group(1))
                 
                 # Broadcast status to all clients
                 await self.broadcast_status()
             
             except Exception as e:
-                logger.error(f"Status update error: {e}")
-            
-            # Update every 2 seconds
-            await asyncio.sleep(2)
+                logger.error("Status update error: %s", e)
+
+            # Update every 2 seconds, measured start-to-start
+            next_tick += 2.0
+            remaining = next_tick - time.monotonic()
+            if remaining < -2.0:
+                # More than a full period behind - snap forward instead
+                # of firing a burst of catch-up polls
+                next_tick = time.monotonic() + 2.0
+                remaining = 2.0
+            await asyncio.sleep(max(0, remaining))
     
     async def run_server(self):
         """Run the WebSocket server"""
@@ -309,7 +431,7 @@ class JoystickServer:
         # Start status update loop
         status_task = asyncio.create_task(self.status_update_loop())
         
-        logger.info(f"WebSocket server starting on {WEBSOCKET_HOST}:{WEBSOCKET_PORT}")
+        logger.info("WebSocket server starting on %s:%s", WEBSOCKET_HOST, WEBSOCKET_PORT)
         
         try:
             async with websockets.serve(
@@ -333,16 +455,26 @@ class JoystickServer:
         finally:
             self.running = False
             status_task.cancel()
-            self.controller.emergency_stop()
-            self.controller.close()
+            for task in (self._writer_task, self._flush_task):
+                if task:
+                    task.cancel()
+            # disconnect() sends the ESTOP itself before closing the port
+            self.controller.disconnect()
             logger.info("Server stopped")
 
 
 def main():
     """Main entry point"""
+    # libuv-based event loop: same asyncio API, much cheaper callback
+    # dispatch on the Pi 4
+    if uvloop is not None:
+        uvloop.install()
+
     logger.info("=" * 60)
     logger.info("Dual Motor WebSocket Control Server")
     logger.info("=" * 60)
+    if uvloop is None:
+        logger.info("uvloop not installed - using the default event loop")
     
     # Create server
     server = JoystickServer(TEENSY_PORT)
@@ -82,6 +82,10 @@ const unsigned long accelUpdateInterval = 10; // Update speed every 10ms
 // Sync Tracking
 unsigned long lastSyncCheck = 0;
 
+// Position Streaming (enabled via STREAM:hz)
+unsigned int streamInterval = 0;  // ms between POS lines, 0 = off
+unsigned long lastStreamUpdate = 0;
+
 // Command Buffer
 String inputBuffer = "";
 bool commandReady = false;
@@ -154,7 +158,15 @@ void loop() {
   
   // Process Command
   if (commandReady) {
-    processCommand(inputBuffer);
+    // Compound frames: several commands joined with '|' arrive as one line
+    int start = 0;
+    int sep = inputBuffer.indexOf('|');
+    while (sep >= 0) {
+      processCommand(inputBuffer.substring(start, sep));
+      start = sep + 1;
+      sep = inputBuffer.indexOf('|', start);
+    }
+    processCommand(inputBuffer.substring(start));
     inputBuffer = "";
     commandReady = false;
   }
@@ -174,6 +186,16 @@ void loop() {
     checkSync();
     lastSyncCheck = millis();
   }
+
+  // Unsolicited position stream - lets the Pi track positions without
+  // polling STATUS
+  if (streamInterval > 0 && millis() - lastStreamUpdate >= streamInterval) {
+    Serial.print("POS:");
+    Serial.print(motor1.position);
+    Serial.print(":");
+    Serial.println(motor2.position);
+    lastStreamUpdate = millis();
+  }
   
   // Status LED heartbeat
   static unsigned long lastBlink = 0;
@@ -436,6 +458,19 @@ void processCommand(String cmd) {
       Serial.println("Invalid BOOST direction");
     }
     
+  } else if (command == "STREAM") {
+    // STREAM:hz - emit POS:<m1>:<m2> lines autonomously; STREAM:0 disables
+    int hz = value.toInt();
+    if (hz > 0) {
+      streamInterval = 1000 / constrain(hz, 1, 100);
+      Serial.print("Position stream enabled at ");
+      Serial.print(hz);
+      Serial.println(" Hz");
+    } else {
+      streamInterval = 0;
+      Serial.println("Position stream disabled");
+    }
+
   } else if (command == "SYNC") {
     // Reset both motor positions simultaneously
     noInterrupts();
@@ -488,8 +523,10 @@ void processCommand(String cmd) {
     Serial.println("  SPIN:RIGHT:speed - Spin right (point turn)");
     Serial.println("  BOOST:LEFT:speed - Boosted spin left");
     Serial.println("  BOOST:RIGHT:speed - Boosted spin right");
+    Serial.println("  STREAM:hz - Stream POS:<m1>:<m2> at hz (0 = off)");
     Serial.println("  SYNC - Synchronize motor positions");
     Serial.println("  CONFIG:BOOST:mult:dur:enabled - Configure boost");
+    Serial.println("  CMD1|CMD2|... - Execute multiple commands in one frame");
   }
 }
 